@@ -1,8 +1,12 @@
+import asyncio
 import base64
 import functools
+import os
 import re
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import suppress
 
-from argon2 import PasswordHasher
+from argon2 import PasswordHasher, Type
 from argon2.exceptions import VerifyMismatchError
 from sanic import Sanic
 from sanic.log import logger
@@ -38,7 +42,87 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
 session_factory = SessionFactory()
-password_hasher = PasswordHasher()
+password_hasher = PasswordHasher(
+    time_cost=3,
+    memory_cost=65536,
+    parallelism=4,
+    hash_len=32,
+    salt_len=16,
+    type=Type.ID,
+)
+password_hasher_executor = ThreadPoolExecutor(max_workers=os.cpu_count())
+email_regex = re.compile(r"^[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+$")
+username_regex = re.compile(r"^[A-Za-z0-9_-]{3,32}$")
+phone_regex = re.compile(r"^[0-9]{11,14}$")
+rehash_tasks = set()
+rehash_profile_cache = {}
+dummy_password_hash = "$argon2id$v=19$m=65536,t=3,p=4$KVTozfamNbNn82baem2KEQ$8M0lh7IpCKn0OAzj3bTF03YQYe9pJSwd42Xxc2foPjc"  # Precomputed with the password hasher's parameters.
+
+
+async def run_password_hasher(func, *args):
+    """
+    Runs a password hasher operation in a dedicated thread pool so Argon2's CPU and memory hard work does not block the event loop.
+
+    Args:
+        func (Callable): Password hasher method being executed, such as hash or verify.
+        *args: Arguments passed to the password hasher method.
+
+    Returns:
+        result
+    """
+    return await asyncio.get_running_loop().run_in_executor(
+        password_hasher_executor, func, *args
+    )
+
+
+def check_needs_rehash(password_hash: str) -> bool:
+    """
+    Checks if a password hash was created with outdated password hasher parameters. Results are cached by parameters, salt length, and hash length, as they do not depend on the salt or hash themselves.
+
+    Args:
+        password_hash (str): Password hash being checked.
+
+    Returns:
+        needs_rehash
+    """
+    hash_separator = password_hash.rfind("$")
+    salt_separator = password_hash.rfind("$", 0, hash_separator)
+    profile = (
+        password_hash[:salt_separator],
+        hash_separator - salt_separator,
+        len(password_hash) - hash_separator,
+    )
+    needs_rehash = rehash_profile_cache.get(profile)
+    if needs_rehash is None:
+        needs_rehash = password_hasher.check_needs_rehash(password_hash)
+        rehash_profile_cache[profile] = needs_rehash
+    return needs_rehash
+
+
+def verify_dummy_password(password: str) -> None:
+    """
+    Verifies a password against the dummy password hash, so that logging into a non existent account takes as long as logging into an existing one. Intended to be run via run_password_hasher.
+
+    Args:
+        password (str): Password provided by the client.
+    """
+    with suppress(VerifyMismatchError):
+        password_hasher.verify(dummy_password_hash, password)
+
+
+async def rehash_password(account: Account, password: str) -> None:
+    """
+    Rehashes an account's password with the current password hasher parameters. Intended to be run as a background task.
+
+    Args:
+        account (Account): Account whose password is being rehashed.
+        password (str): The account's verified plaintext password.
+    """
+    try:
+        password_hash = await run_password_hasher(password_hasher.hash, password)
+        await Account.filter(id=account.id).update(password=password_hash)
+    except Exception:
+        logger.exception(f"Client ({account.email}) password could not be rehashed")
 
 
 def generate_initial_admin(app: Sanic):
@@ -71,7 +155,9 @@ def generate_initial_admin(app: Sanic):
             account = await Account.create(
                 username="Head Admin",
                 email=security_config.INITIAL_ADMIN_EMAIL,
-                password=password_hasher.hash(security_config.INITIAL_ADMIN_PASSWORD),
+                password=await run_password_hasher(
+                    password_hasher.hash, security_config.INITIAL_ADMIN_PASSWORD
+                ),
                 verified=True,
             )
             await account.roles.add(role)
@@ -95,33 +181,33 @@ async def register(
     Raises:
         CredentialsError
     """
-    if not re.search(
-        r"^[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+$", request.form.get("email")
-    ):
+    email = request.form.get("email")
+    username = request.form.get("username")
+    phone = request.form.get("phone")
+    password = request.form.get("password")
+    if len(email) > 255 or not email_regex.match(email):
         raise CredentialsError("Please use a valid email such as you@mail.com.", 400)
-    if not re.search(r"^[A-Za-z0-9_-]{3,32}$", request.form.get("username")):
+    if not username_regex.match(username):
         raise CredentialsError(
             "Username must be between 3-32 characters and not contain any special characters other than _ or -.",
             400,
         )
-    if request.form.get("phone") and not re.search(
-        r"^[0-9]{11,14}$", request.form.get("phone")
-    ):
+    if phone and not phone_regex.match(phone):
         raise CredentialsError(
             "Please use a valid phone format such as 15621435489 or 19498963648018.",
             400,
         )
-    if 100 > len(request.form.get("password")) > 8:
+    if not 8 <= len(password) <= 100:
         raise CredentialsError(
-            "Password must be more than 8 characters and must be less than 100 characters.",
+            "Password must be between 8-100 characters.",
             400,
         )
     try:
         account = await Account.create(
-            email=request.form.get("email").lower(),
-            username=request.form.get("username"),
-            password=password_hasher.hash(request.form.get("password")),
-            phone=request.form.get("phone"),
+            email=email.lower(),
+            username=username,
+            password=await run_password_hasher(password_hasher.hash, password),
+            phone=phone,
             verified=verified,
             disabled=disabled,
         )
@@ -154,26 +240,41 @@ async def login(
     if request.headers.get("Authorization"):
         authorization_type, credentials = request.headers.get("Authorization").split()
         if authorization_type == "Basic":
-            email_or_username, password = (
-                base64.b64decode(credentials).decode().split(":")
-            )
+            try:
+                credentials = base64.b64decode(credentials, validate=True)
+                separator = credentials.index(b":")
+                email_or_username = credentials[:separator].decode()
+                password = credentials[separator + 1 :].decode()
+            except ValueError:
+                raise CredentialsError("Invalid authorization header credentials.")
+            if len(password) > 256:
+                raise CredentialsError("Password must be 256 characters or less.")
         else:
             raise CredentialsError("Invalid authorization header type.")
     else:
         raise CredentialsError("Credentials not provided.")
     if not account:
         try:
-            account = await Account.get_via_email(email_or_username)
-        except NotFoundError as e:
-            if security_config.ALLOW_LOGIN_WITH_USERNAME:
-                account = await Account.get_via_username(email_or_username)
-            else:
-                raise e
+            try:
+                account = await Account.get_via_email(email_or_username)
+            except NotFoundError as e:
+                if security_config.ALLOW_LOGIN_WITH_USERNAME:
+                    account = await Account.get_via_username(email_or_username)
+                else:
+                    raise e
+        except NotFoundError:
+            await run_password_hasher(
+                verify_dummy_password, password
+            )  # Equalizes response time with logins into existing accounts.
+            raise
     try:
-        password_hasher.verify(account.password, password)
-        if password_hasher.check_needs_rehash(account.password):
-            account.password = password_hasher.hash(password)
-            await account.save(update_fields=["password"])
+        await run_password_hasher(password_hasher.verify, account.password, password)
+        if check_needs_rehash(account.password):
+            rehash_task = asyncio.get_running_loop().create_task(
+                rehash_password(account, password)
+            )
+            rehash_tasks.add(rehash_task)
+            rehash_task.add_done_callback(rehash_tasks.discard)
         account.validate()
         return await session_factory.get(
             "authentication", request, account, two_factor=two_factor
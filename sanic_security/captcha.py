@@ -3,7 +3,7 @@ from contextlib import suppress
 
 from sanic import Request
 
-from sanic_security.exceptions import NotFoundError, JWTDecodeError
+from sanic_security.exceptions import JWTDecodeError
 from sanic_security.models import CaptchaSession, SessionFactory
 
 
@@ -39,12 +39,8 @@ async def request_captcha(request: Request) -> CaptchaSession:
     Returns:
         captcha_session
     """
-    with suppress(NotFoundError, JWTDecodeError):
-        captcha_session = await CaptchaSession.decode(request)
-        captcha_session.active = False
-        await captcha_session.save(
-            update_fields=["active"]
-        )  # Deactivates client's existing session.
+    with suppress(JWTDecodeError):
+        await CaptchaSession.deactivate_client_session(request)
     return await session_factory.get("captcha", request)
 
 
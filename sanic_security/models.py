@@ -1,22 +1,29 @@
+import asyncio
 import datetime
+import functools
+import hashlib
+import hmac
 import os
 import random
 import string
+import time
 import uuid
 from types import SimpleNamespace
 
 import jwt
 from captcha.image import ImageCaptcha
 from jwt import DecodeError
+from jwt.algorithms import get_default_algorithms
 from sanic.log import logger
 from sanic.request import Request
-from sanic.response import HTTPResponse, file
+from sanic.response import HTTPResponse, raw
 from tortoise import fields, Model
 from tortoise.exceptions import DoesNotExist
+from tortoise.expressions import F
 
 from sanic_security.configuration import config as security_config
 from sanic_security.exceptions import *
-from sanic_security.utils import get_ip, dir_exists
+from sanic_security.utils import get_ip, dir_exists, TTLCache
 
 
 """
@@ -37,6 +44,26 @@ You should have received a copy of the GNU Affero General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
+decoded_session_cache = TTLCache(maxsize=10000, ttl=60)
+client_location_cache = TTLCache(maxsize=50000, ttl=300)
+jwt_algorithms = get_default_algorithms()
+
+
+@functools.lru_cache(maxsize=8)
+def get_prepared_key(key: str, algorithm: str):
+    """
+    Prepares a key for the session encoding algorithm once, so PEM keys are not parsed on every encode and decode.
+
+    Args:
+        key (str): Secret or public key being prepared.
+        algorithm (str): Algorithm the key is used with.
+
+    Returns:
+        prepared_key
+    """
+    jwt_algorithm = jwt_algorithms.get(algorithm)
+    return jwt_algorithm.prepare_key(key) if jwt_algorithm else key
+
 
 class BaseModel(Model):
     """
@@ -216,14 +243,26 @@ class Session(BaseModel):
     expiration_date = fields.DatetimeField(null=True)
     active = fields.BooleanField(default=True)
     ip = fields.CharField(max_length=16)
-    token = fields.UUIDField(unique=True, default=uuid.uuid4, max_length=36)
+    token = fields.UUIDField(unique=True, default=uuid.uuid4)
     bearer: fields.ForeignKeyRelation["Account"] = fields.ForeignKeyField(
         "models.Account", null=True
     )
     ctx = SimpleNamespace()
 
-    def __init__(self, **kwargs):
-        super().__init__(**kwargs)
+    @classmethod
+    @functools.lru_cache()
+    def _get_cookie_name(cls, prefix: str) -> str:
+        return f"{prefix}_{cls.__name__.lower()[:4]}_session"
+
+    @classmethod
+    def get_cookie_name(cls) -> str:
+        """
+        Retrieves the name of the cookie this session type is stored in on the client.
+
+        Returns:
+            cookie_name
+        """
+        return cls._get_cookie_name(security_config.SESSION_PREFIX)
 
     def json(self) -> dict:
         return {
@@ -246,27 +285,30 @@ class Session(BaseModel):
         """
         if self.deleted:
             raise DeletedError("Session has been deleted.")
-        elif (
-            self.expiration_date
-            and datetime.datetime.now(datetime.timezone.utc) >= self.expiration_date
-        ):
+        elif self.expiration_date and time.time() >= self.expiration_date.timestamp():
             raise ExpiredError()
         elif not self.active:
             raise DeactivatedError()
 
     async def check_client_location(self, request) -> None:
         """
-        Checks if client ip address has been used previously within other sessions.
+        Checks if client ip address has been used previously within other sessions. Recognised locations are cached so repeat requests from the same location skip the database.
 
         Raises:
             UnrecognisedLocationError
         """
         ip = get_ip(request)
-        if not await self.filter(ip=ip, bearer=self.bearer, deleted=False).exists():
+        cache_key = (self.__class__, self.bearer_id, ip)
+        if client_location_cache.get(cache_key):
+            return
+        if not await self.filter(
+            ip=ip, bearer_id=self.bearer_id, deleted=False
+        ).exists():
             logger.warning(
                 f"Client ({self.bearer.email}/{ip}) ip address is unrecognised"
             )
             raise UnrecognisedLocationError()
+        client_location_cache.set(cache_key, True)
 
     def encode(self, response: HTTPResponse):
         """
@@ -284,9 +326,13 @@ class Session(BaseModel):
             "ip": self.ip,
             **self.ctx.__dict__,
         }
-        cookie = f"{security_config.SESSION_PREFIX}_{self.__class__.__name__.lower()[:4]}_session"
+        cookie = self.get_cookie_name()
         encoded_session = jwt.encode(
-            payload, security_config.SECRET, security_config.SESSION_ENCODING_ALGORITHM
+            payload,
+            get_prepared_key(
+                security_config.SECRET, security_config.SESSION_ENCODING_ALGORITHM
+            ),
+            security_config.SESSION_ENCODING_ALGORITHM,
         )
         if isinstance(encoded_session, bytes):
             response.cookies[cookie] = encoded_session.decode()
@@ -303,7 +349,7 @@ class Session(BaseModel):
     @classmethod
     def decode_raw(cls, request: Request) -> dict:
         """
-        Decodes JWT token from client cookie into a python dict.
+        Decodes JWT token from client cookie into a python dict. Verified tokens are cached so repeat requests skip signature verification.
 
         Args:
             request (Request): Sanic request parameter.
@@ -314,22 +360,35 @@ class Session(BaseModel):
         Raises:
             JWTDecodeError
         """
-        cookie = request.cookies.get(
-            f"{security_config.SESSION_PREFIX}_{cls.__name__.lower()[:4]}_session"
+        cookie = request.cookies.get(cls.get_cookie_name())
+        if not cookie:
+            raise JWTDecodeError("Session token not provided.")
+        key = (
+            security_config.SECRET
+            if not security_config.PUBLIC_SECRET
+            else security_config.PUBLIC_SECRET
         )
-        try:
-            if not cookie:
-                raise JWTDecodeError("Session token not provided.")
-            else:
-                return jwt.decode(
+        cache_key = (
+            key,
+            security_config.SESSION_ENCODING_ALGORITHM,
+            hashlib.sha256(cookie.encode()).digest(),
+        )
+        decoded_raw = decoded_session_cache.get(cache_key)
+        if decoded_raw is None:
+            try:
+                decoded_raw = jwt.decode(
                     cookie,
-                    security_config.SECRET
-                    if not security_config.PUBLIC_SECRET
-                    else security_config.PUBLIC_SECRET,
+                    get_prepared_key(key, security_config.SESSION_ENCODING_ALGORITHM),
                     security_config.SESSION_ENCODING_ALGORITHM,
                 )
-        except DecodeError as e:
-            raise JWTDecodeError(str(e))
+            except DecodeError as e:
+                raise JWTDecodeError(str(e))
+            decoded_session_cache.set(
+                cache_key,
+                decoded_raw,
+                decoded_raw["exp"] - time.time() if "exp" in decoded_raw else None,
+            )
+        return dict(decoded_raw)
 
     @classmethod
     async def decode(cls, request: Request):
@@ -350,13 +409,27 @@ class Session(BaseModel):
             decoded_raw = cls.decode_raw(request)
             decoded_session = (
                 await cls.filter(token=decoded_raw["token"])
-                .prefetch_related("bearer")
+                .select_related("bearer")
                 .get()
             )
         except DoesNotExist:
             raise NotFoundError("Session could not be found.")
         return decoded_session
 
+    @classmethod
+    async def deactivate_client_session(cls, request: Request) -> None:
+        """
+        Deactivates the client's existing session with a single update instead of retrieving it first.
+
+        Args:
+            request (Request): Sanic request parameter.
+
+        Raises:
+            JWTDecodeError
+        """
+        decoded_raw = cls.decode_raw(request)
+        await cls.filter(token=decoded_raw["token"]).update(active=False)
+
     class Meta:
         abstract = True
 
@@ -373,6 +446,7 @@ class VerificationSession(Session):
     attempts = fields.IntField(default=0)
     code = fields.CharField(max_length=10, null=True)
     _cache = security_config.CACHE
+    _codes = []
 
     @classmethod
     def _initialize_cache(cls) -> None:
@@ -384,13 +458,21 @@ class VerificationSession(Session):
     @classmethod
     def get_random_code(cls) -> str:
         """
-        Retrieves a random cached verification session code.
+        Retrieves a random cached verification session code. Cached codes are loaded into memory and reloaded if they are missing from the cache.
         """
         raise NotImplementedError()
 
+    def _log_maxed_out(self, request: Request) -> None:
+        """
+        Logs a client maxing out on session challenge attempts.
+        """
+        logger.warning(
+            f"Client ({self.bearer.email if self.bearer else None}/{get_ip(request)}) has maxed out on session challenge attempts"
+        )
+
     async def check_code(self, request: Request, code: str) -> None:
         """
-        Used to check if code passed is equivalent to the session code.
+        Used to check if code passed is equivalent to the session code. Codes are compared in constant time, and no code is accepted once the maximum amount of attempts is reached.
 
         Args:
             code (str): Code being cross-checked with session code.
@@ -402,15 +484,17 @@ class VerificationSession(Session):
             UnrecognisedLocationError
         """
         await self.check_client_location(request)
-        if self.code != code:
-            if self.attempts < security_config.MAX_CHALLENGE_ATTEMPTS:
+        if self.attempts >= security_config.MAX_CHALLENGE_ATTEMPTS:
+            self._log_maxed_out(request)
+            raise MaxedOutChallengeError()
+        if not hmac.compare_digest(self.code.encode(), (code or "").encode()):
+            if await self.filter(
+                id=self.id, attempts__lt=security_config.MAX_CHALLENGE_ATTEMPTS
+            ).update(attempts=F("attempts") + 1):
                 self.attempts += 1
-                await self.save(update_fields=["attempts"])
                 raise ChallengeError("The value provided does not match.")
             else:
-                logger.warning(
-                    f"Client ({self.bearer.email}/{get_ip(request)}) has maxed out on session challenge attempts"
-                )
+                self._log_maxed_out(request)
                 raise MaxedOutChallengeError()
         else:
             self.active = False
@@ -438,9 +522,11 @@ class TwoStepSession(VerificationSession):
 
     @classmethod
     def get_random_code(cls) -> str:
-        cls._initialize_cache()
-        with open(f"{cls._cache}/verification/codes.txt", "r") as f:
-            return random.choice(f.read().split())
+        if not cls._codes or not os.path.exists(f"{cls._cache}/verification/codes.txt"):
+            cls._initialize_cache()
+            with open(f"{cls._cache}/verification/codes.txt", "r") as f:
+                cls._codes = f.read().split()
+        return random.choice(cls._codes)
 
     class Meta:
         table = "two_step_session"
@@ -451,6 +537,8 @@ class CaptchaSession(VerificationSession):
     Validates a client as human with a captcha challenge.
     """
 
+    _images = {}
+
     @classmethod
     def _initialize_cache(cls) -> None:
         if not dir_exists(f"{cls._cache}/captcha"):
@@ -464,17 +552,48 @@ class CaptchaSession(VerificationSession):
 
     @classmethod
     def get_random_code(cls) -> str:
-        cls._initialize_cache()
-        return random.choice(os.listdir(f"{cls._cache}/captcha")).split(".")[0]
+        code = random.choice(cls._codes) if cls._codes else None
+        if not code or not os.path.exists(f"{cls._cache}/captcha/{code}.png"):
+            cls._initialize_cache()
+            cls._codes = [
+                file_name.split(".")[0]
+                for file_name in os.listdir(f"{cls._cache}/captcha")
+            ]
+            code = random.choice(cls._codes)
+        return code
+
+    def _read_image(self) -> bytes:
+        """
+        Reads captcha image file, regenerating it if it is missing from the cache.
+
+        Returns:
+            captcha_image
+        """
+        path = f"{self._cache}/captcha/{self.code}.png"
+        if not os.path.exists(path):
+            self._initialize_cache()
+            if not os.path.exists(path):
+                ImageCaptcha(190, 90, fonts=[security_config.CAPTCHA_FONT]).write(
+                    self.code, path
+                )
+            type(self)._codes = []  # Code pool is stale and is reloaded on next use.
+        with open(path, "rb") as f:
+            return f.read()
 
     async def get_image(self) -> HTTPResponse:
         """
-        Retrieves captcha image file.
+        Retrieves captcha image file. Images are read from the cache once and then served from memory.
 
         Returns:
             captcha_image
         """
-        return await file(f"{self._cache}/captcha/{self.code}.png")
+        image = self._images.get(self.code)
+        if image is None:
+            image = await asyncio.get_running_loop().run_in_executor(
+                None, self._read_image
+            )
+            self._images[self.code] = image
+        return raw(image, content_type="image/png")
 
     class Meta:
         table = "captcha_session"
@@ -490,7 +609,7 @@ class AuthenticationSession(Session):
     """
 
     two_factor = fields.BooleanField(default=False)
-    refresh_token = fields.UUIDField(unique=True, default=uuid.uuid4, max_length=36)
+    refresh_token = fields.UUIDField(unique=True, default=uuid.uuid4)
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
@@ -513,7 +632,7 @@ class AuthenticationSession(Session):
         try:
             decoded_session = (
                 await cls.filter(refresh_token=decoded_raw["refresh_token"])
-                .prefetch_related("bearer")
+                .select_related("bearer")
                 .get()
             )
             if decoded_session.active and not decoded_session.deleted:
@@ -540,6 +659,23 @@ class SessionFactory:
     Used to create and retrieve a session with pre-set values.
     """
 
+    @staticmethod
+    def get_expiration_date(seconds: int):
+        """
+        Calculates a session expiration date from the current time.
+
+        Args:
+            seconds (int): The amount of seconds till session expiration. Setting to 0 will disable expiration.
+
+        Returns:
+            expiration_date
+        """
+        if seconds == 0:
+            return None
+        return datetime.datetime.fromtimestamp(
+            time.time() + seconds, datetime.timezone.utc
+        )
+
     async def get(
         self, session_type: str, request: Request, account: Account = None, **kwargs
     ):
@@ -564,10 +700,9 @@ class SessionFactory:
                 ip=get_ip(request),
                 code=CaptchaSession.get_random_code(),
                 bearer=account,
-                expiration_date=datetime.datetime.utcnow()
-                + datetime.timedelta(seconds=security_config.CAPTCHA_SESSION_EXPIRATION)
-                if security_config.CAPTCHA_SESSION_EXPIRATION != 0
-                else None,
+                expiration_date=self.get_expiration_date(
+                    security_config.CAPTCHA_SESSION_EXPIRATION
+                ),
             )
         elif session_type == "two-step":
             return await TwoStepSession.create(
@@ -575,24 +710,18 @@ class SessionFactory:
                 code=TwoStepSession.get_random_code(),
                 ip=get_ip(request),
                 bearer=account,
-                expiration_date=datetime.datetime.utcnow()
-                + datetime.timedelta(
-                    seconds=security_config.TWO_STEP_SESSION_EXPIRATION
-                )
-                if security_config.TWO_STEP_SESSION_EXPIRATION != 0
-                else None,
+                expiration_date=self.get_expiration_date(
+                    security_config.TWO_STEP_SESSION_EXPIRATION
+                ),
             )
         elif session_type == "authentication":
             return await AuthenticationSession.create(
                 **kwargs,
                 bearer=account,
                 ip=get_ip(request),
-                expiration_date=datetime.datetime.utcnow()
-                + datetime.timedelta(
-                    seconds=security_config.AUTHENTICATION_SESSION_EXPIRATION
-                )
-                if security_config.AUTHENTICATION_SESSION_EXPIRATION != 0
-                else None,
+                expiration_date=self.get_expiration_date(
+                    security_config.AUTHENTICATION_SESSION_EXPIRATION
+                ),
             )
         else:
             raise ValueError("Invalid session type.")
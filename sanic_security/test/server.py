@@ -1,4 +1,3 @@
-from argon2 import PasswordHasher
 from sanic import Sanic, text
 from tortoise.contrib.sanic import register_tortoise
 from tortoise.exceptions import IntegrityError
@@ -11,6 +10,8 @@ from sanic_security.authentication import (
     logout,
     refresh_authentication,
     generate_initial_admin,
+    password_hasher,
+    run_password_hasher,
 )
 from sanic_security.authorization import (
     assign_role,
@@ -20,7 +21,7 @@ from sanic_security.authorization import (
 from sanic_security.captcha import request_captcha, requires_captcha
 from sanic_security.configuration import config as security_config
 from sanic_security.exceptions import SecurityError
-from sanic_security.models import Account, Role, SessionFactory
+from sanic_security.models import Account, Role, SessionFactory, CaptchaSession
 from sanic_security.utils import json
 from sanic_security.verification import (
     request_two_step_verification,
@@ -50,7 +51,6 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 app = Sanic("test")
 session_factory = SessionFactory()
-password_hasher = PasswordHasher()
 
 
 @app.post("api/test/auth/register")
@@ -90,10 +90,9 @@ async def on_login(request):
     """
     Login to an account with an email and password.
     """
-    authentication_session = await login(
-        request, two_factor=request.form.get("two_factor") == "true"
-    )
-    if request.form.get("two_factor") == "true":
+    two_factor = request.form.get("two_factor") == "true"
+    authentication_session = await login(request, two_factor=two_factor)
+    if two_factor:
         two_step_session = await request_two_step_verification(
             request, authentication_session.bearer
         )
@@ -169,6 +168,15 @@ async def on_captcha_request(request):
     return response
 
 
+@app.get("api/test/capt/image")
+async def on_captcha_image(request):
+    """
+    Request captcha image.
+    """
+    captcha_session = await CaptchaSession.decode(request)
+    return await captcha_session.get_image()
+
+
 @app.post("api/test/capt")
 @requires_captcha()
 async def on_captcha_attempt(request, captcha_session):
@@ -205,10 +213,9 @@ async def on_authorization(request, authentication_session):
     Permissions authorization.
     """
     await check_roles(request, request.form.get("role"))
-    if request.form.get("permissions_required"):
-        await check_permissions(
-            request, *request.form.get("permissions_required").split(", ")
-        )
+    permissions_required = request.form.get("permissions_required")
+    if permissions_required:
+        await check_permissions(request, *permissions_required.split(", "))
     return text("Account permitted.")
 
 
@@ -233,13 +240,10 @@ async def on_account_creation(request):
     Creates a usable account.
     """
     try:
-        username = "test"
-        if request.form.get("username"):
-            username = request.form.get("username")
         account = await Account.create(
-            username=username,
+            username=request.form.get("username") or "test",
             email=request.form.get("email"),
-            password=password_hasher.hash("testtest"),
+            password=await run_password_hasher(password_hasher.hash, "testtest"),
             verified=True,
             disabled=False,
         )
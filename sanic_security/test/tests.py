@@ -4,7 +4,7 @@ from unittest import TestCase
 
 import httpx
 
-from sanic_security.configuration import Config
+from sanic_security.configuration import Config, DEFAULT_CONFIG
 
 
 """
@@ -44,13 +44,14 @@ class RegistrationTest(TestCase):
         verified: bool,
         username: str = "test",
         phone: str = None,
+        password: str = "testtest",
     ):
         registration_response = self.client.post(
             "http://127.0.0.1:8000/api/test/auth/register",
             data={
                 "username": username,
                 "email": email,
-                "password": "testtest",
+                "password": password,
                 "disabled": disabled,
                 "verified": verified,
                 "phone": phone,
@@ -67,7 +68,7 @@ class RegistrationTest(TestCase):
 
     def test_invalid_registration(self):
         """
-        Registration with an intentionally invalid email, username, and phone.
+        Registration with an intentionally invalid email, username, phone, and password.
         """
         invalid_email_registration_response = self.register(
             "invalidregister.com", False, True
@@ -96,6 +97,12 @@ class RegistrationTest(TestCase):
         assert (
             too_many_characters_registration_response.status_code == 400
         ), too_many_characters_registration_response.text
+        invalid_password_registration_response = self.register(
+            "invalidpass@register.com", False, True, password="short"
+        )
+        assert (
+            invalid_password_registration_response.status_code == 400
+        ), invalid_password_registration_response.text
 
     def test_registration_disabled(self):
         """
@@ -185,7 +192,7 @@ class LoginTest(TestCase):
 
     def test_invalid_login(self):
         """
-        Login with an intentionally incorrect password and into a non existent account.
+        Login with an intentionally incorrect password, into a non existent account, with malformed credentials, and with an oversized password.
         """
         self.client.post(
             "http://127.0.0.1:8000/api/test/account",
@@ -205,6 +212,20 @@ class LoginTest(TestCase):
         assert (
             unavailable_account_login_response.status_code == 404
         ), unavailable_account_login_response
+        malformed_credentials_login_response = self.client.post(
+            "http://127.0.0.1:8000/api/test/auth/login",
+            headers={"Authorization": "Basic bm90LWJhc2U2NA=="},
+        )
+        assert (
+            malformed_credentials_login_response.status_code == 400
+        ), malformed_credentials_login_response.text
+        oversized_password_login_response = self.client.post(
+            "http://127.0.0.1:8000/api/test/auth/login",
+            auth=("incorrectpass@login.com", "a" * 257),
+        )
+        assert (
+            oversized_password_login_response.status_code == 400
+        ), oversized_password_login_response.text
 
     def test_logout(self):
         """
@@ -309,7 +330,7 @@ class VerificationTest(TestCase):
 
     def test_captcha(self):
         """
-        Captcha request and attempt.
+        Captcha request, image retrieval, and attempt.
         """
         captcha_request_response = self.client.post(
             "http://127.0.0.1:8000/api/test/capt/request"
@@ -317,6 +338,12 @@ class VerificationTest(TestCase):
         assert (
             captcha_request_response.status_code == 200
         ), captcha_request_response.text
+        captcha_image_response = self.client.get(
+            "http://127.0.0.1:8000/api/test/capt/image"
+        )
+        assert (
+            captcha_image_response.headers["content-type"] == "image/png"
+        ), captcha_image_response.text
         captcha_attempt_response = self.client.post(
             "http://127.0.0.1:8000/api/test/capt",
             data={"captcha": json.loads(captcha_request_response.text)["data"]},
@@ -357,6 +384,41 @@ class VerificationTest(TestCase):
             two_step_verification_attempt_response.status_code == 200
         ), two_step_verification_attempt_response.text
 
+    def test_two_step_verification_maxed_out(self):
+        """
+        Two step verification attempts until the maximum amount of attempts is reached, after which even the correct code is rejected. Relies on the test server using the default MAX_CHALLENGE_ATTEMPTS.
+        """
+        self.client.post(
+            "http://127.0.0.1:8000/api/test/account",
+            data={"email": "two_step_maxed@verification.com"},
+        )
+        two_step_verification_request_response = self.client.post(
+            "http://127.0.0.1:8000/api/test/two-step/request",
+            data={"email": "two_step_maxed@verification.com"},
+        )
+        assert (
+            two_step_verification_request_response.status_code == 200
+        ), two_step_verification_request_response.text
+        for i in range(DEFAULT_CONFIG["MAX_CHALLENGE_ATTEMPTS"]):
+            two_step_verification_invalid_attempt_response = self.client.post(
+                "http://127.0.0.1:8000/api/test/two-step",
+                data={"code": "123xyz"},
+            )
+            assert (
+                json.loads(two_step_verification_invalid_attempt_response.text)["data"]
+                == "ChallengeError"
+            ), two_step_verification_invalid_attempt_response.text
+        two_step_verification_maxed_out_response = self.client.post(
+            "http://127.0.0.1:8000/api/test/two-step",
+            data={
+                "code": json.loads(two_step_verification_request_response.text)["data"]
+            },
+        )
+        assert (
+            json.loads(two_step_verification_maxed_out_response.text)["data"]
+            == "MaxedOutChallengeError"
+        ), two_step_verification_maxed_out_response.text
+
     def test_account_verification(self):
         """
         Account registration and verification process with successful login.
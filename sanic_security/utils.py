@@ -1,8 +1,15 @@
 import os
+import time
+from collections import OrderedDict
 
 from sanic.request import Request
 from sanic.response import json as sanic_json, HTTPResponse
 
+try:
+    from orjson import dumps as json_dumps
+except ImportError:
+    from sanic.response import json_dumps
+
 
 """
 An effective, simple, and async security library for the Sanic framework.
@@ -25,7 +32,7 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 def get_ip(request: Request) -> str:
     """
-    Retrieves ip address from client request.
+    Retrieves ip address from client request. Proxied client addresses are resolved by Sanic via its FORWARDED_SECRET, REAL_IP_HEADER, and PROXIES_COUNT configuration.
 
     Args:
         request (Request): Sanic request parameter.
@@ -33,7 +40,7 @@ def get_ip(request: Request) -> str:
     Returns:
         ip
     """
-    return request.remote_addr if request.remote_addr else request.ip
+    return request.remote_addr or request.ip
 
 
 def dir_exists(path: str) -> bool:
@@ -50,13 +57,14 @@ def dir_exists(path: str) -> bool:
         os.makedirs(path)
         exists = False
     except FileExistsError:
-        exists = os.listdir(path)
+        with os.scandir(path) as entries:
+            exists = next(entries, None) is not None
     return exists
 
 
 def json(message: str, data, status_code: int = 200) -> HTTPResponse:
     """
-    A preformatted Sanic json response.
+    A preformatted Sanic json response. Serialized with orjson when it is installed.
 
     Args:
         message (int): Message describing data or relaying human readable information.
@@ -67,5 +75,80 @@ def json(message: str, data, status_code: int = 200) -> HTTPResponse:
         json
     """
     return sanic_json(
-        {"message": message, "code": status_code, "data": data}, status=status_code
+        {"message": message, "code": status_code, "data": data},
+        status=status_code,
+        dumps=json_dumps,
     )
+
+
+class TTLCache:
+    """
+    A bounded least recently used cache whose entries expire after a set amount of seconds.
+
+    Attributes:
+        maxsize (int): Maximum amount of entries stored before the least recently used entry is evicted.
+        ttl (float): Default amount of seconds an entry is stored before expiring.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+
+    def get(self, key, default=None):
+        """
+        Retrieves an unexpired entry.
+
+        Args:
+            key (Hashable): Key of the entry being retrieved.
+            default (Any): Returned when the entry does not exist or has expired.
+
+        Returns:
+            value
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return default
+        value, expires = entry
+        if time.monotonic() >= expires:
+            del self._entries[key]
+            return default
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key, value, ttl: float = None) -> None:
+        """
+        Stores an entry, evicting the least recently used entry if the cache is full.
+
+        Args:
+            key (Hashable): Key of the entry being stored.
+            value (Any): Value of the entry being stored.
+            ttl (float): Amount of seconds till the entry expires. If None, the cache's default ttl is used.
+        """
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0:
+            return
+        self._entries[key] = (value, time.monotonic() + ttl)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def pop(self, key, default=None):
+        """
+        Removes an entry.
+
+        Args:
+            key (Hashable): Key of the entry being removed.
+            default (Any): Returned when the entry does not exist.
+
+        Returns:
+            value
+        """
+        entry = self._entries.pop(key, None)
+        return default if entry is None else entry[0]
+
+    def clear(self) -> None:
+        """
+        Removes all entries.
+        """
+        self._entries.clear()
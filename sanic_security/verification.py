@@ -3,7 +3,7 @@ from contextlib import suppress
 
 from sanic.request import Request
 
-from sanic_security.exceptions import AccountError, JWTDecodeError, NotFoundError
+from sanic_security.exceptions import AccountError, JWTDecodeError
 from sanic_security.models import (
     Account,
     TwoStepSession,
@@ -49,12 +49,8 @@ async def request_two_step_verification(
     Returns:
          two_step_session
     """
-    with suppress(NotFoundError, JWTDecodeError):
-        two_step_session = await TwoStepSession.decode(request)
-        two_step_session.active = False
-        await two_step_session.save(
-            update_fields=["active"]
-        )  # Deactivates client's existing session.
+    with suppress(JWTDecodeError):
+        await TwoStepSession.deactivate_client_session(request)
     if not account:
         account = await Account.get_via_email(request.form.get("email"))
     two_step_session = await session_factory.get("two-step", request, account)
@@ -32,6 +32,7 @@ setup(
             "cryptography>=3.3.1",
         ],
         "crypto": ["cryptography>=3.3.1"],
+        "orjson": ["orjson>=3.0.0"],
     },
     platforms="any",
 )